@@ -16,11 +16,27 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib import colors
 from reportlab.lib.units import mm
 from reportlab.pdfgen import canvas
+from reportlab.lib.utils import ImageReader
 from PIL import Image
+import numpy as np
+import pandas as pd
 import base64
+import hashlib
+import html
+import json
+from functools import lru_cache
+from itertools import zip_longest
+
+# ----------------------- Helper functions -----------------------
 
-st.markdown("""
+# Dark-blue theme plus white form field labels, injected as a single block.
+_CSS = """
 <style>
+.reportview-container { background: #0b2336; color: #e6f2fb; }
+.stApp { background: linear-gradient(180deg,#052235 0%, #08344a 100%); color: #e6f2fb; }
+.card { background-color: #062b43; padding: 16px; border-radius: 8px; }
+.muted { color:#bcd6e6 }
+.section-title { color:#dff4ff; font-weight:600; }
 /* Streamlit form field labels only */
 .stTextInput label,
 .stNumberInput label,
@@ -30,25 +46,12 @@ st.markdown("""
     font-weight: 500;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# ----------------------- Helper functions -----------------------
 
 def set_page_style():
     st.set_page_config(page_title="Payslip Generator", layout="centered")
-    # small CSS for dark-blue theme
-    st.markdown(
-        """
-        <style>
-        .reportview-container { background: #0b2336; color: #e6f2fb; }
-        .stApp { background: linear-gradient(180deg,#052235 0%, #08344a 100%); color: #e6f2fb; }
-        .card { background-color: #062b43; padding: 16px; border-radius: 8px; }
-        .muted { color:#bcd6e6 }
-        .section-title { color:#dff4ff; font-weight:600; }
-        </style>
-        """,
-        unsafe_allow_html=True,
-    )
+    st.markdown(_CSS, unsafe_allow_html=True)
 
 
 CURRENCY_SYMBOLS = {
@@ -59,63 +62,174 @@ CURRENCY_SYMBOLS = {
     "EUR": "€",
 }
 
+# (thousands separator, decimal separator) per numbering style. Amounts are
+# always formatted US-style first and then mapped through the style's table,
+# so no per-call branching on the style is needed.
+_SEPS = {"US": (",", "."), "EU": (".", ",")}
+_SEP_TRANS = {fmt: str.maketrans({",": ts, ".": ds}) for fmt, (ts, ds) in _SEPS.items()}
+
+
 # Format amounts with US or EU numbering style. IDR defaults to no decimals.
-def format_amount(value: float, currency: str, number_format: str = "US") -> str:
+def _format_amount(value: float, currency: str, number_format: str = "US") -> str:
     try:
+        symbol = CURRENCY_SYMBOLS[currency]
         if currency == "IDR":
             # No decimals for IDR
             integer = int(round(value))
             s = f"{integer:,}"
-            if number_format == "EU":
-                s = s.replace(",", ".")
-            return f"{CURRENCY_SYMBOLS[currency]} {s}"
         else:
             s = f"{value:,.2f}"  # 1,234,567.89
-            if number_format == "EU":
-                # swap comma and dot
-                s = s.replace(",", "X").replace(".", ",").replace("X", ".")
-            return f"{CURRENCY_SYMBOLS[currency]} {s}"
+        return f"{symbol} {s.translate(_SEP_TRANS[number_format])}"
     except Exception:
         return f"{value}"
 
 
-def create_payslip_pdf(data: dict, logo_bytes: bytes | None = None) -> bytes:
+# Bulk variant for batch mode: the currency symbol, format spec and separator
+# table are resolved once for the whole column instead of once per value.
+def format_amounts(values, currency: str, number_format: str = "US") -> list[str]:
+    symbol = CURRENCY_SYMBOLS[currency]
+    spec = ",.0f" if currency == "IDR" else ",.2f"
+    trans = _SEP_TRANS[number_format]
+    return [f"{symbol} {format(v, spec).translate(trans)}" for v in values]
+
+
+# Streamlit re-executes this script on every interaction, so a plain module-level
+# lru_cache would start empty each time. Keep the memoized callable in
+# st.cache_resource so repeated amounts are formatted once per process.
+@st.cache_resource
+def _cached_format_amount():
+    return lru_cache(maxsize=512)(_format_amount)
+
+
+format_amount = _cached_format_amount()
+
+
+# Batch totals for a CSV of employees. Expected columns: emp_id, base, ot_hours,
+# ot_rate, plus any number of allow_* and ded_* amount columns. Totals are summed
+# column-wise over contiguous float64 arrays rather than per employee in Python.
+def compute_batch_totals(df: pd.DataFrame) -> pd.DataFrame:
+    allow_cols = [col for col in df.columns if col.startswith("allow_")]
+    ded_cols = [col for col in df.columns if col.startswith("ded_")]
+    base = df["base"].to_numpy(dtype=np.float64)
+    ot_amount = df["ot_hours"].to_numpy(dtype=np.float64) * df["ot_rate"].to_numpy(dtype=np.float64)
+    total_allowances = df[allow_cols].to_numpy(dtype=np.float64).sum(axis=1)
+    total_deductions = df[ded_cols].to_numpy(dtype=np.float64).sum(axis=1)
+
+    out = df.copy()
+    out["ot_amount"] = ot_amount
+    out["total_allowances"] = total_allowances
+    out["total_earnings"] = base + ot_amount + total_allowances
+    out["total_deductions"] = total_deductions
+    out["net_pay"] = out["total_earnings"].to_numpy() - total_deductions
+    return out
+
+
+# Decoded once per upload and shrunk to the largest size it is shown at (120px in
+# the sidebar preview, 60pt in the PDF header), so reruns skip the PNG/JPEG decode.
+@st.cache_resource(show_spinner=False)
+def _decode_logo(raw: bytes) -> Image.Image:
+    img = Image.open(BytesIO(raw))
+    img.thumbnail((240, 240))
+    return img
+
+
+def _build_payslip_pdf(data: dict, logo_bytes: bytes | None = None) -> bytes:
     buffer = BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
+    c = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
     width, height = A4
 
+    # Most payslips fit on one page: work out the total height of the content
+    # up front and only do per-row page-break checks when it would overflow.
+    n_rows = max(2 + len(data["allowances"]), len(data["deductions"]))
+    content_height = (300 + 12 * len(data["company_address"].split("\n"))
+                      + 14 * n_rows + 12 * len(data["benefits"]))
+    paginate = height - content_height < 80
+
+    # Only emit setFont/setFillColor operators when the value actually changes.
+    state = {"font": None, "fill": None}
+
+    def set_font(name, size):
+        if state["font"] != (name, size):
+            c.setFont(name, size)
+            state["font"] = (name, size)
+
+    def set_fill(color):
+        if state["fill"] != color:
+            c.setFillColor(color)
+            state["fill"] = color
+
     def check_page(y):
-        if y < 80:
+        if paginate and y < 80:
             c.showPage()
+            # showPage resets the graphics state; restore what was in use
+            font, fill = state["font"], state["fill"]
+            state["font"] = state["fill"] = None
+            if font:
+                set_font(*font)
+            if fill is not None:
+                set_fill(fill)
             return height - 80
         return y
 
+    def draw_rows(y, rows, step):
+        # Draw table rows of (x, text, right_aligned) cells in the current font,
+        # batching each page's rows into a single text object.
+        font = state["font"]
+        tx = c.beginText()
+        for cells in rows:
+            for x, text, right in cells:
+                if right:
+                    x -= c.stringWidth(text, *font)
+                tx.setTextOrigin(x, y)
+                tx.textOut(text)
+            y -= step
+            if paginate and y < 80:
+                c.drawText(tx)
+                y = check_page(y)
+                tx = c.beginText()
+        c.drawText(tx)
+        return y
+
     # Colors
     header_color = colors.HexColor("#083a5d")
     text_color = colors.black
 
     # Header block
-    c.setFillColor(header_color)
+    set_fill(header_color)
     c.rect(0, height - 80, width, 80, fill=1, stroke=0)
 
-    # Title + Meta
-    c.setFillColor(colors.white)
-    c.setFont("Helvetica-Bold", 20)
-    c.drawString(120, height - 45, "Payslip")
-    c.setFont("Helvetica", 10)
-    c.drawString(120, height - 60, f"Date: {data['date']}")
-    c.drawRightString(width - 40, height - 45, f"Payslip No: {data['payslip_no']}")
+    if logo_bytes:
+        try:
+            logo = ImageReader(_decode_logo(logo_bytes))
+            c.drawImage(logo, 40, height - 70, width=60, height=60, preserveAspectRatio=True, mask="auto")
+        except Exception:
+            pass
+
+    # Title + Meta, written as one text object
+    set_fill(colors.white)
+    meta_no = f"Payslip No: {data['payslip_no']}"
+    tx = c.beginText(120, height - 45)
+    tx.setFont("Helvetica-Bold", 20)
+    tx.textOut("Payslip")
+    tx.setFont("Helvetica", 10)
+    tx.setTextOrigin(120, height - 60)
+    tx.textOut(f"Date: {data['date']}")
+    tx.setTextOrigin(width - 40 - c.stringWidth(meta_no, "Helvetica", 10), height - 45)
+    tx.textOut(meta_no)
+    c.drawText(tx)
+    # fonts were set on the text object only; make the next set_font emit
+    state["font"] = None
 
     # Reset to dark text for body
-    c.setFillColor(text_color)
+    set_fill(text_color)
 
     y = height - 110
 
     # Company Info
-    c.setFont("Helvetica-Bold", 11)
+    set_font("Helvetica-Bold", 11)
     c.drawString(40, y, data['company_name'])
     y -= 14
-    c.setFont("Helvetica", 10)
+    set_font("Helvetica", 10)
     for line in data['company_address'].split("\n"):
         c.drawString(40, y, line)
         y -= 12
@@ -123,11 +237,10 @@ def create_payslip_pdf(data: dict, logo_bytes: bytes | None = None) -> bytes:
 
     # Employee info
     y -= 24
-    c.setFont("Helvetica-Bold", 11)
-    c.setFont("Helvetica-Bold", 11)
+    set_font("Helvetica-Bold", 11)
     c.drawString(40, y, "Employee Information")
     y -= 18
-    c.setFont("Helvetica", 10)
+    set_font("Helvetica", 10)
     c.drawString(40, y, f"Name: {data['employee_name']}")
     c.drawString(300, y, f"Employee ID: {data['employee_id']}")
     y -= 14
@@ -137,88 +250,168 @@ def create_payslip_pdf(data: dict, logo_bytes: bytes | None = None) -> bytes:
     # Earnings / Deductions header
     y -= 28
     y = check_page(y)
-    c.setFont("Helvetica-Bold", 11)
+    set_font("Helvetica-Bold", 11)
     c.drawString(40, y, "Earnings")
     c.drawString(300, y, "Amount")
     c.drawString(380, y, "Deductions")
     c.drawString(520, y, "Amount")
     y -= 14
 
-    c.setFont("Helvetica", 10)
-
-    # Base Salary
-    c.drawString(40, y, "Base Salary")
-    c.drawRightString(360, y, data["fmt_base_salary"])
-    if data["deductions"]:
-        c.drawString(380, y, data["deductions"][0]["label"])
-        c.drawRightString(560, y, data["deductions"][0]["fmt"])
-    y -= 14
-    y = check_page(y)
-
-    # OT
-    c.drawString(40, y, f"Overtime ({data['ot_hours']} hrs @ {data['fmt_ot_rate']}/hr)")
-    c.drawRightString(360, y, data["fmt_ot_amount"])
-    if len(data["deductions"]) > 1:
-        c.drawString(380, y, data["deductions"][1]["label"])
-        c.drawRightString(560, y, data["deductions"][1]["fmt"])
-    y -= 14
-    y = check_page(y)
-
-    # Allowances
-    for i, a in enumerate(data["allowances"]):
-        c.drawString(40, y, a["label"])
-        c.drawRightString(360, y, a["fmt"])
-        if len(data["deductions"]) > 2 + i:
-            d = data["deductions"][2 + i]
-            c.drawString(380, y, d["label"])
-            c.drawRightString(560, y, d["fmt"])
-        y -= 14
-        y = check_page(y)
+    set_font("Helvetica", 10)
+
+    # Earnings rows (base, OT, allowances) side by side with the deductions
+    earnings = [
+        ("Base Salary", data["fmt_base_salary"]),
+        (f"Overtime ({data['ot_hours']} hrs @ {data['fmt_ot_rate']}/hr)", data["fmt_ot_amount"]),
+    ] + [(a["label"], a["fmt"]) for a in data["allowances"]]
+    deductions = [(d["label"], d["fmt"]) for d in data["deductions"]]
+    rows = []
+    for e, d in zip_longest(earnings, deductions):
+        cells = []
+        if e:
+            cells += [(40, e[0], False), (360, e[1], True)]
+        if d:
+            cells += [(380, d[0], False), (560, d[1], True)]
+        rows.append(cells)
+    y = draw_rows(y, rows, 14)
 
     # Totals
     y -= 10
-    c.setFont("Helvetica-Bold", 11)
+    set_font("Helvetica-Bold", 11)
     c.drawString(40, y, "Total Earnings")
     c.drawRightString(360, y, data["fmt_total_earnings"])
     c.drawString(380, y, "Total Deductions")
     c.drawRightString(560, y, data["fmt_total_deductions"])
     y -= 22
 
-    c.setFont("Helvetica-Bold", 14)
+    set_font("Helvetica-Bold", 14)
     c.drawString(40, y, "Net Pay:")
     c.drawRightString(560, y, data["fmt_net_pay"])
     y -= 30
     y = check_page(y)
 
     # Employer-paid Benefits
-    c.setFont("Helvetica-Bold", 11)
+    set_font("Helvetica-Bold", 11)
     c.drawString(40, y, "Employer-Paid Benefits")
     y -= 16
-    c.setFont("Helvetica", 10)
-    for b in data['benefits']:
-        c.drawString(40, y, b['label'])
-        c.drawRightString(560, y, b['fmt'])
-        y -= 12
-        y = check_page(y)
-
-    # END Benefits
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(40, y, "Benefits (Non-financial)")
-    y -= 16
-    c.setFont("Helvetica", 10)
-
-    for b in data["benefits"]:
-        c.drawString(40, y, f"- {b}")
-        y -= 12
-        y = check_page(y)
+    set_font("Helvetica", 10)
+    y = draw_rows(y, [[(40, b['label'], False), (560, b['fmt'], True)] for b in data['benefits']], 12)
 
     # IMPORTANT: remove final c.showPage()
     c.save()
-    buffer.seek(0)
-    return buffer.read()
+    return buffer.getvalue()
+
+
+# Stable cache key for a payslip: a BLAKE2b digest of the canonical JSON form of
+# the data plus the logo bytes. Hashing this in C is much cheaper than letting
+# Streamlit walk the nested data dict on every lookup.
+def payslip_key(data: dict, logo_bytes: bytes | None = None) -> str:
+    h = hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16)
+    if logo_bytes:
+        h.update(logo_bytes)
+    return h.hexdigest()
+
+
+# Leading-underscore arguments are excluded from Streamlit's hashing, so the
+# cache is keyed on the digest alone.
+@st.cache_data(show_spinner=False, max_entries=64)
+def _cached_payslip_pdf(key: str, _data: dict, _logo_bytes: bytes | None) -> bytes:
+    return _build_payslip_pdf(_data, _logo_bytes)
+
+
+# Cached so that reruns with identical payslip data skip the ReportLab rebuild.
+def create_payslip_pdf(data: dict, logo_bytes: bytes | None = None, key: str | None = None) -> bytes:
+    return _cached_payslip_pdf(key or payslip_key(data, logo_bytes), data, logo_bytes)
+
+
+# Escape the free-text address for the HTML preview and keep its line breaks.
+def _fmt_address(addr: str) -> str:
+    return html.escape(addr).replace("\n", "<br/>")
+
+
+# Totals, formatted amounts and preview HTML for one payslip. Cached so that
+# reruns with unchanged inputs skip all number formatting and HTML building.
+# Line items are passed as tuples of (label, amount) pairs.
+@st.cache_data(show_spinner=False, max_entries=64)
+def compute_view(details: dict, base_salary: float, ot_hours: float, ot_rate: float,
+                 allowance_items: tuple, deduction_items: tuple, benefit_items: tuple,
+                 currency: str, number_format: str) -> dict:
+    allowances = [{"label": label, "amount": amount} for label, amount in allowance_items]
+    deductions = [{"label": label, "amount": amount} for label, amount in deduction_items]
+    benefits = [{"label": label, "amount": amount} for label, amount in benefit_items]
+
+    # Perform calculations; line items are totalled in the same pass that
+    # formats them, with a plain local accumulator
+    ot_amount = ot_hours * ot_rate
+    total_allowances = 0.0
+    for a in allowances:
+        a['fmt'] = format_amount(a['amount'], currency, number_format)
+        total_allowances += a['amount']
+    total_deductions = 0.0
+    for d in deductions:
+        d['fmt'] = format_amount(d['amount'], currency, number_format)
+        total_deductions += d['amount']
+    total_earnings = base_salary + ot_amount + total_allowances
+    net_pay = total_earnings - total_deductions
+
+    # Prepare formatted strings
+    for b in benefits:
+        b['fmt'] = format_amount(b['amount'], currency, number_format)
+    fmt_base_salary = format_amount(base_salary, currency, number_format)
+    fmt_ot_rate = format_amount(ot_rate, currency, number_format)
+    fmt_ot_amount = format_amount(ot_amount, currency, number_format)
+    fmt_total_earnings = format_amount(total_earnings, currency, number_format)
+    fmt_total_deductions = format_amount(total_deductions, currency, number_format)
+    fmt_net_pay = format_amount(net_pay, currency, number_format)
+
+    # Simple HTML preview styled with dark blue theme
+    fmt_address = _fmt_address(details['company_address'])
+    parts = [f"""
+    <div style='background:#062b43;padding:20px;border-radius:8px;color:#e6f2fb'>
+      <h2 style='margin:0;color:#dff4ff'>Payslip</h2>
+      <p style='margin:4px 0'><strong>{details['company_name']}</strong><br/>{fmt_address}<br/>Phone: {details['company_phone']}</p>
+      <p style='margin:4px 0' class='muted'>Payslip No: {details['payslip_no']} &nbsp;&nbsp; Date: {details['date']}</p>
+      <hr style='border:0;border-top:1px solid #0b445f' />
+      <h4 style='margin-bottom:4px'>Employee</h4>
+      <p style='margin:0'>{details['employee_name']} - {details['employee_id']} <br/> {details['position']} | {details['period']}</p>
+
+      <h4 style='margin-top:12px'>Earnings</h4>
+      <table style='width:100%'>
+        <tr><td>Base Salary</td><td style='text-align:right'>{fmt_base_salary}</td></tr>
+        <tr><td>OT ({ot_hours} hrs @ {fmt_ot_rate}/hr)</td><td style='text-align:right'>{fmt_ot_amount}</td></tr>
+    """]
+    for a in allowances:
+        parts.append(f"<tr><td>{a['label']}</td><td style='text-align:right'>{a['fmt']}</td></tr>")
+    parts.append(f"<tr style='border-top:1px solid #0b445f'><td><strong>Total Earnings</strong></td><td style='text-align:right'><strong>{fmt_total_earnings}</strong></td></tr>")
+    parts.append("</table>")
+
+    parts.append("<h4 style='margin-top:12px'>Deductions</h4><table style='width:100%'>")
+    for d in deductions:
+        parts.append(f"<tr><td>{d['label']}</td><td style='text-align:right'>{d['fmt']}</td></tr>")
+    parts.append(f"<tr style='border-top:1px solid #0b445f'><td><strong>Total Deductions</strong></td><td style='text-align:right'><strong>{fmt_total_deductions}</strong></td></tr></table>")
+
+    parts.append(f"<h3 style='margin-top:12px'>Net Pay: <span style='float:right'>{fmt_net_pay}</span></h3>")
+
+    parts.append("<h4 style='margin-top:18px'>Employer-Paid Benefits</h4><table style='width:100%'>")
+    for b in benefits:
+        parts.append(f"<tr><td>{b['label']}</td><td style='text-align:right'>{b['fmt']}</td></tr>")
+    parts.append("</table></div>")
+    preview_html = "".join(parts)
+
+    return {
+        'ot_amount': ot_amount,
+        'allowances': allowances,
+        'deductions': deductions,
+        'benefits': benefits,
+        'fmt_base_salary': fmt_base_salary,
+        'fmt_ot_rate': fmt_ot_rate,
+        'fmt_ot_amount': fmt_ot_amount,
+        'fmt_total_earnings': fmt_total_earnings,
+        'fmt_total_deductions': fmt_total_deductions,
+        'fmt_net_pay': fmt_net_pay,
+        'preview_html': preview_html,
+    }
 
-# For compatibility with ReportLab's ImageReader
-from reportlab.lib.utils import ImageReader
 
 # ----------------------- Streamlit App -----------------------
 
@@ -229,13 +422,9 @@ st.title("Payslip Generator")
 with st.sidebar:
     st.header("Company Info")
     company_name = st.text_input("Company name", value="My Company Ltd.")
-    company_address = st.text_area("Company address", value='''123 Business Road\nBusiness City\nCountry''')
-Business City
-Country''')
-Business City, 12345")
+    company_address = st.text_area("Company address", value="123 Business Road\nBusiness City\nCountry")
     company_phone = st.text_input("Company phone", value="+1 234 567 890")
 
-    st.header("Settings")
     st.header("Settings")
     currency = st.selectbox("Currency", ["IDR", "SGD", "USD", "GBP", "EUR"], index=2)
     number_format = st.radio("Numbering format", ["US", "EU"], index=0, help="US: 1,234.56 | EU: 1.234,56")
@@ -278,113 +467,108 @@ with st.form("payslip_form"):
         deductions.append({"label": label, "amount": amount})
 
     st.subheader("Benefits (employer-paid)")
-benefits = []
-ben_cnt = st.number_input("Number of benefits", min_value=0, max_value=10, value=1)
-for i in range(ben_cnt):
-    label = st.text_input(f"Benefit {i+1} label", value=("Health Insurance" if i==0 else f"Benefit {i+1}"), key=f"ben_label_{i}")
-    amount = st.number_input(f"Benefit {i+1} amount", min_value=0.0, value=0.0, key=f"ben_amount_{i}")
-    benefits.append({"label": label, "amount": amount})
-
-st.form_submit_button("Generate Payslip")("Generate Payslip")
-
-# Perform calculations
-ot_amount = ot_hours * ot_rate
-total_allowances = sum(a['amount'] for a in allowances)
-total_deductions = sum(d['amount'] for d in deductions)
-total_earnings = base_salary + ot_amount + total_allowances
-net_pay = total_earnings - total_deductions
-
-# Prepare formatted strings
-for b in benefits:
-    b['fmt'] = format_amount(b['amount'], currency, number_format)
-fmt_base_salary = format_amount(base_salary, currency, number_format)
-fmt_ot_rate = format_amount(ot_rate, currency, number_format)
-fmt_ot_amount = format_amount(ot_amount, currency, number_format)
-fmt_total_earnings = format_amount(total_earnings, currency, number_format)
-fmt_total_deductions = format_amount(total_deductions, currency, number_format)
-fmt_net_pay = format_amount(net_pay, currency, number_format)
-
-for a in allowances:
-    a['fmt'] = format_amount(a['amount'], currency, number_format)
-for d in deductions:
-    d['fmt'] = format_amount(d['amount'], currency, number_format)
-
-# Right column: Preview & PDF
-st.markdown("---")
-colA, colB = st.columns([1,1])
-with colA:
-    st.subheader("Preview")
-    # Simple HTML preview styled with dark blue theme
-    preview_html = f"""
-    <div style='background:#062b43;padding:20px;border-radius:8px;color:#e6f2fb'>
-      <h2 style='margin:0;color:#dff4ff'>Payslip</h2>
-      <p style='margin:4px 0'><strong>{company_name}</strong><br/>{company_address.replace('
-','<br/>')}<br/>Phone: {company_phone}</p>
-      <p style='margin:4px 0' class='muted'>Payslip No: {payslip_no} &nbsp;&nbsp; Date: {date}</p>
-      <hr style='border:0;border-top:1px solid #0b445f' />
-      <h4 style='margin-bottom:4px'>Employee</h4>
-      <p style='margin:0'>{employee_name} - {employee_id} <br/> {position} | {period}</p>
-
-      <h4 style='margin-top:12px'>Earnings</h4>
-      <table style='width:100%'>
-        <tr><td>Base Salary</td><td style='text-align:right'>{fmt_base_salary}</td></tr>
-        <tr><td>OT ({ot_hours} hrs @ {fmt_ot_rate}/hr)</td><td style='text-align:right'>{fmt_ot_amount}</td></tr>
-    """
-    for a in allowances:
-        preview_html += f"<tr><td>{a['label']}</td><td style='text-align:right'>{a['fmt']}</td></tr>"
-    preview_html += f"<tr style='border-top:1px solid #0b445f'><td><strong>Total Earnings</strong></td><td style='text-align:right'><strong>{fmt_total_earnings}</strong></td></tr>"
-    preview_html += "</table>"
-
-    preview_html += "<h4 style='margin-top:12px'>Deductions</h4><table style='width:100%'>"
-    for d in deductions:
-        preview_html += f"<tr><td>{d['label']}</td><td style='text-align:right'>{d['fmt']}</td></tr>"
-    preview_html += f"<tr style='border-top:1px solid #0b445f'><td><strong>Total Deductions</strong></td><td style='text-align:right'><strong>{fmt_total_deductions}</strong></td></tr></table>"
-
-    preview_html += f"<h3 style='margin-top:12px'>Net Pay: <span style='float:right'>{fmt_net_pay}</span></h3>"
-
-    preview_html += "<h4 style='margin-top:18px'>Employer-Paid Benefits</h4><table style='width:100%'>"
-for b in benefits:
-    preview_html += f"<tr><td>{b['label']}</td><td style='text-align:right'>{b['fmt']}</td></tr>"
-preview_html += "</table>"</div>"
-
-    st.markdown(preview_html, unsafe_allow_html=True)
-
-with colB:
-    st.subheader("Download PDF")
-    logo_bytes = None
-    if logo_file is not None:
-        logo_bytes = logo_file.read()
-        try:
-            st.image(logo_bytes, width=120)
-        except Exception:
-            pass
-
-    data = {
+    benefits = []
+    ben_cnt = st.number_input("Number of benefits", min_value=0, max_value=10, value=1)
+    for i in range(ben_cnt):
+        label = st.text_input(f"Benefit {i+1} label", value=("Health Insurance" if i==0 else f"Benefit {i+1}"), key=f"ben_label_{i}")
+        amount = st.number_input(f"Benefit {i+1} amount", min_value=0.0, value=0.0, key=f"ben_amount_{i}")
+        benefits.append({"label": label, "amount": amount})
+
+    submitted = st.form_submit_button("Generate Payslip")
+
+# Inputs only take effect on submit; keep showing the last generated payslip
+# on later reruns (e.g. sidebar changes or the Build PDF button).
+if submitted:
+    st.session_state['generated'] = True
+
+if st.session_state.get('generated'):
+    # Perform calculations and prepare formatted strings
+    details = {
         'company_name': company_name,
         'company_address': company_address,
         'company_phone': company_phone,
-        'date': date.strftime("%Y-%m-%d"),
         'payslip_no': payslip_no,
+        'date': date,
         'employee_name': employee_name,
         'employee_id': employee_id,
         'position': position,
         'period': period,
-        'base_salary': base_salary,
-        'fmt_base_salary': fmt_base_salary,
-        'ot_hours': ot_hours,
-        'ot_rate': ot_rate,
-        'fmt_ot_rate': fmt_ot_rate,
-        'ot_amount': ot_amount,
-        'fmt_ot_amount': fmt_ot_amount,
-        'allowances': allowances,
-        'deductions': deductions,
-        'benefits': benefits,
-        'fmt_total_earnings': fmt_total_earnings,
-        'fmt_total_deductions': fmt_total_deductions,
-        'fmt_net_pay': fmt_net_pay,
     }
+    view = compute_view(
+        details, base_salary, ot_hours, ot_rate,
+        tuple((a['label'], a['amount']) for a in allowances),
+        tuple((d['label'], d['amount']) for d in deductions),
+        tuple((b['label'], b['amount']) for b in benefits),
+        currency, number_format,
+    )
 
-    pdf_bytes = create_payslip_pdf(data, logo_bytes)
-    st.download_button("Download Payslip (PDF)", data=pdf_bytes, file_name=f"payslip_{payslip_no}.pdf", mime="application/pdf")
+    # Right column: Preview & PDF
+    st.markdown("---")
+    colA, colB = st.columns([1,1])
+    with colA:
+        st.subheader("Preview")
+        st.markdown(view['preview_html'], unsafe_allow_html=True)
+
+    with colB:
+        st.subheader("Download PDF")
+        logo_bytes = None
+        if logo_file is not None:
+            logo_bytes = logo_file.read()
+            try:
+                st.image(_decode_logo(logo_bytes), width=120)
+            except Exception:
+                pass
+
+        # The PDF data is only assembled when a PDF is built or a stored one is
+        # checked against the current inputs.
+        def build_data():
+            return {
+                'company_name': company_name,
+                'company_address': company_address,
+                'company_phone': company_phone,
+                'date': date.strftime("%Y-%m-%d"),
+                'payslip_no': payslip_no,
+                'employee_name': employee_name,
+                'employee_id': employee_id,
+                'position': position,
+                'period': period,
+                'base_salary': base_salary,
+                'fmt_base_salary': view['fmt_base_salary'],
+                'ot_hours': ot_hours,
+                'ot_rate': ot_rate,
+                'fmt_ot_rate': view['fmt_ot_rate'],
+                'ot_amount': view['ot_amount'],
+                'fmt_ot_amount': view['fmt_ot_amount'],
+                'allowances': view['allowances'],
+                'deductions': view['deductions'],
+                'benefits': view['benefits'],
+                'fmt_total_earnings': view['fmt_total_earnings'],
+                'fmt_total_deductions': view['fmt_total_deductions'],
+                'fmt_net_pay': view['fmt_net_pay'],
+            }
+
+        if st.button("Build PDF"):
+            data = build_data()
+            pdf_key = payslip_key(data, logo_bytes)
+            st.session_state['pdf'] = create_payslip_pdf(data, logo_bytes, pdf_key)
+            st.session_state['pdf_key'] = pdf_key
+        # Offer the stored PDF only while the inputs it was built from are unchanged.
+        if 'pdf_key' in st.session_state and st.session_state['pdf_key'] == payslip_key(build_data(), logo_bytes):
+            st.download_button("Download Payslip (PDF)", data=st.session_state['pdf'], file_name=f"payslip_{payslip_no}.pdf", mime="application/pdf")
+else:
+    st.info("Fill in the details and click Generate Payslip to see the preview.")
+
+
+# Batch totals
+with st.expander("Batch totals (CSV upload)"):
+    st.markdown("Columns: `emp_id, base, ot_hours, ot_rate`, plus any `allow_*` and `ded_*` amounts.")
+    batch_file = st.file_uploader("Upload employees CSV", type=["csv"], key="batch_csv")
+    if batch_file is not None:
+        try:
+            batch_df = compute_batch_totals(pd.read_csv(batch_file).fillna(0))
+            batch_df["net_pay_fmt"] = format_amounts(batch_df["net_pay"].tolist(), currency, number_format)
+            st.dataframe(batch_df, use_container_width=True)
+        except Exception as e:
+            st.error(f"Could not process CSV: {e}")
 
 st.caption("Built for Streamlit Cloud — include reportlab and pillow in your requirements.txt")